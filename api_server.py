@@ -5,26 +5,232 @@ Provides REST API endpoints to manage Dify apps programmatically
 """
 
 import os
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-from dify_client import DifyClient
-from functools import wraps
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import fastjsonschema
+import requests
+from flask import Flask, request, jsonify, g
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import HTTPException
+from dify_client import DifyClient, make_variable
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson for faster request/response handling"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default,
+                            option=orjson.OPT_NON_STR_KEYS).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
-CORS(app)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+
+# Cross-origin support is only needed for browser clients
+if os.getenv('ENABLE_CORS'):
+    from flask_cors import CORS
+    CORS(app)
+
+# Request body schemas. Compiled once at import; missing optional fields
+# are filled in from their "default" by the generated validators.
+_STRING = {"type": "string"}
+_NON_EMPTY_STRING = {"type": "string", "minLength": 1}
+
+LOGIN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "email": _NON_EMPTY_STRING,
+        "password": _NON_EMPTY_STRING,
+        "base_url": _NON_EMPTY_STRING
+    },
+    "required": ["email", "password"]
+}
+
+APP_DETAILS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "ids": {"type": "array", "items": _NON_EMPTY_STRING}
+    },
+    "required": ["ids"]
+}
+
+CREATE_APP_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": _NON_EMPTY_STRING,
+        "mode": {"type": "string", "default": "chat"},
+        "icon": {"type": "string", "default": "🤖"},
+        "description": {"type": "string", "default": ""}
+    },
+    "required": ["name"]
+}
+
+RENAME_APP_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": _NON_EMPTY_STRING,
+        "icon": _STRING,
+        "description": _STRING
+    }
+}
+
+UPDATE_PROMPT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "prompt": _STRING,
+        "mode": {"type": "string", "default": "chat"}
+    },
+    "required": ["prompt"]
+}
+
+UPDATE_MODEL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "model_name": _NON_EMPTY_STRING,
+        "temperature": {"type": "number", "default": 0.7},
+        "max_tokens": {"type": "integer", "default": 2048},
+        "top_p": {"type": "number", "default": 1.0}
+    },
+    "required": ["model_name"]
+}
+
+ADD_VARIABLE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "variable_name": _NON_EMPTY_STRING,
+        "variable_type": {"type": "string", "default": "text-input"},
+        "label": {"type": "string", "default": ""},
+        "required": {"type": "boolean", "default": False},
+        "max_length": {"type": "integer", "default": 48}
+    },
+    "required": ["variable_name"]
+}
+
+# Same item shape (and defaults) as the single /variables route
+ADD_VARIABLES_SCHEMA = {
+    "type": "array",
+    "items": ADD_VARIABLE_SCHEMA
+}
 
-# Global client instance
-client = None
+OPENING_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "opening_statement": _STRING,
+        "suggested_questions": {"type": "array", "items": _STRING}
+    },
+    "required": ["opening_statement"]
+}
 
-def require_auth(f):
-    """Decorator to ensure client is authenticated"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        global client
-        if client is None:
-            return jsonify({"error": "Not authenticated. Call /login first"}), 401
-        return f(*args, **kwargs)
-    return decorated_function
+KNOWLEDGE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "dataset_id": _NON_EMPTY_STRING,
+        "retrieval_model": {"type": "string", "enum": ["single", "multiple"],
+                            "default": "multiple"}
+    },
+    "required": ["dataset_id"]
+}
+
+CREATE_DATASET_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": _NON_EMPTY_STRING,
+        "description": {"type": "string", "default": ""}
+    },
+    "required": ["name"]
+}
+
+_validate_login = fastjsonschema.compile(LOGIN_SCHEMA)
+_validate_app_details = fastjsonschema.compile(APP_DETAILS_SCHEMA)
+_validate_create_app = fastjsonschema.compile(CREATE_APP_SCHEMA)
+_validate_rename_app = fastjsonschema.compile(RENAME_APP_SCHEMA)
+_validate_update_prompt = fastjsonschema.compile(UPDATE_PROMPT_SCHEMA)
+_validate_update_model = fastjsonschema.compile(UPDATE_MODEL_SCHEMA)
+_validate_add_variable = fastjsonschema.compile(ADD_VARIABLE_SCHEMA)
+_validate_add_variables = fastjsonschema.compile(ADD_VARIABLES_SCHEMA)
+_validate_opening = fastjsonschema.compile(OPENING_SCHEMA)
+_validate_knowledge = fastjsonschema.compile(KNOWLEDGE_SCHEMA)
+_validate_create_dataset = fastjsonschema.compile(CREATE_DATASET_SCHEMA)
+
+def _request_body():
+    """Parse the JSON body once, without caching it on the request"""
+    # force=True also accepts bodies sent without a JSON Content-Type
+    return request.get_json(force=True, cache=False)
+
+@app.errorhandler(requests.HTTPError)
+def _upstream_error(e):
+    """Pass Dify's error status through to the caller"""
+    status = e.response.status_code if e.response is not None else 502
+    return jsonify({"error": str(e)}), status
+
+@app.errorhandler(Exception)
+def _unhandled_error(e):
+    """Return JSON for every other error"""
+    if isinstance(e, HTTPException):
+        return jsonify({"error": e.description}), e.code
+    return jsonify({"error": str(e)}), 500
+
+@app.errorhandler(fastjsonschema.JsonSchemaException)
+def _invalid_body(e):
+    """Reject request bodies that don't match the endpoint schema"""
+    return jsonify({"error": f"Invalid request body: {e.message}"}), 400
+
+# Logged-in clients keyed by session id (returned from /login), as
+# (client, last used) pairs in least-recently-used order
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+# Idle sessions expire after SESSION_TTL seconds; beyond MAX_SESSIONS
+# the least recently used ones are dropped
+_SESSION_TTL = float(os.getenv('SESSION_TTL', 3600))
+_MAX_SESSIONS = int(os.getenv('MAX_SESSIONS', 100))
+
+def _evict_sessions():
+    """Drop expired and excess sessions, closing their clients"""
+    cutoff = time.monotonic() - _SESSION_TTL
+    evicted = []
+    with _clients_lock:
+        while _clients:
+            session_id, (client, last_used) = next(iter(_clients.items()))
+            if last_used >= cutoff and len(_clients) <= _MAX_SESSIONS:
+                break
+            del _clients[session_id]
+            evicted.append(client)
+    # Close outside the lock; it may wait on pooled connections
+    for client in evicted:
+        client.close()
+
+# Endpoints reachable without a session
+_PUBLIC_ENDPOINTS = {'health', 'login', 'static'}
+
+@app.before_request
+def _authenticate():
+    """Ensure the caller has an authenticated session"""
+    # Let CORS preflights and unknown URLs (404) through untouched
+    if request.method == 'OPTIONS' or request.endpoint in _PUBLIC_ENDPOINTS \
+            or request.endpoint is None:
+        return None
+    session_id = request.headers.get('X-Session-Id')
+    client = None
+    with _clients_lock:
+        entry = _clients.get(session_id)
+        if entry is not None and entry[1] >= time.monotonic() - _SESSION_TTL:
+            client = entry[0]
+            _clients[session_id] = (client, time.monotonic())
+            _clients.move_to_end(session_id)
+    if client is None:
+        return jsonify({"error": "Not authenticated. Call /login first and send X-Session-Id"}), 401
+    g.client = client
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -34,188 +240,165 @@ def health():
 @app.route('/login', methods=['POST'])
 def login():
     """Login to Dify"""
-    global client
-    
-    data = request.json
-    email = data.get('email')
-    password = data.get('password')
+    data = _validate_login(_request_body())
+    email = data['email']
+    password = data['password']
     base_url = data.get('base_url', os.getenv('DIFY_API_URL', 'https://api-production-50f6.up.railway.app'))
     
-    if not email or not password:
-        return jsonify({"error": "Email and password required"}), 400
-    
-    try:
-        client = DifyClient(base_url)
-        result = client.login(email, password)
-        return jsonify({"success": True, "message": "Logged in successfully"})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 401
+    client = DifyClient(base_url)
+    result = client.login(email, password)
+    session_id = uuid.uuid4().hex
+    with _clients_lock:
+        _clients[session_id] = (client, time.monotonic())
+    _evict_sessions()
+    return jsonify({"success": True, "message": "Logged in successfully",
+                    "session_id": session_id})
+
+@app.route('/logout', methods=['POST'])
+def logout():
+    """End the session and release its connections"""
+    with _clients_lock:
+        entry = _clients.pop(request.headers.get('X-Session-Id'), None)
+    if entry is not None:
+        entry[0].close()
+    return jsonify({"success": True, "message": "Logged out"})
 
 @app.route('/apps', methods=['GET'])
-@require_auth
 def get_apps():
     """Get all apps"""
-    try:
-        result = client.get_apps()
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    result = g.client.get_apps()
+    return jsonify(result)
 
 @app.route('/apps/<app_id>', methods=['GET'])
-@require_auth
 def get_app_detail(app_id):
     """Get app details"""
-    try:
-        result = client.get_app_detail(app_id)
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    result = g.client.get_app_detail(app_id)
+    return jsonify(result)
+
+@app.route('/apps/details', methods=['POST'])
+def get_app_details_bulk():
+    """Get details of several apps"""
+    data = _validate_app_details(_request_body())
+    result = g.client.get_app_details_bulk(data['ids'])
+    return jsonify({"data": result})
 
 @app.route('/apps', methods=['POST'])
-@require_auth
 def create_app():
     """Create a new app"""
-    data = request.json
-    try:
-        result = client.create_app(
-            name=data.get('name'),
-            mode=data.get('mode', 'chat'),
-            icon=data.get('icon', '🤖'),
-            description=data.get('description', '')
-        )
-        return jsonify(result), 201
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    data = _validate_create_app(_request_body())
+    result = g.client.create_app(
+        name=data['name'],
+        mode=data['mode'],
+        icon=data['icon'],
+        description=data['description']
+    )
+    return jsonify(result), 201
 
 @app.route('/apps/<app_id>', methods=['PUT'])
-@require_auth
 def rename_app(app_id):
     """Rename app"""
-    data = request.json
-    try:
-        result = client.rename_app(
-            app_id=app_id,
-            new_name=data.get('name'),
-            icon=data.get('icon'),
-            description=data.get('description')
-        )
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    data = _validate_rename_app(_request_body())
+    result = g.client.rename_app(
+        app_id=app_id,
+        new_name=data.get('name'),
+        icon=data.get('icon'),
+        description=data.get('description')
+    )
+    return jsonify(result)
 
 @app.route('/apps/<app_id>', methods=['DELETE'])
-@require_auth
 def delete_app(app_id):
     """Delete app"""
-    try:
-        result = client.delete_app(app_id)
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    result = g.client.delete_app(app_id)
+    return jsonify(result)
 
 @app.route('/apps/<app_id>/prompt', methods=['PUT'])
-@require_auth
 def update_prompt(app_id):
     """Update app prompt"""
-    data = request.json
-    try:
-        result = client.update_prompt(
-            app_id=app_id,
-            prompt=data.get('prompt'),
-            mode=data.get('mode', 'chat')
-        )
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    data = _validate_update_prompt(_request_body())
+    result = g.client.update_prompt(
+        app_id=app_id,
+        prompt=data['prompt'],
+        mode=data['mode']
+    )
+    return jsonify(result)
 
 @app.route('/apps/<app_id>/model', methods=['PUT'])
-@require_auth
 def update_model_settings(app_id):
     """Update model settings"""
-    data = request.json
-    try:
-        result = client.update_model_settings(
-            app_id=app_id,
-            model_name=data.get('model_name'),
-            temperature=data.get('temperature', 0.7),
-            max_tokens=data.get('max_tokens', 2048),
-            top_p=data.get('top_p', 1.0)
-        )
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    data = _validate_update_model(_request_body())
+    result = g.client.update_model_settings(
+        app_id=app_id,
+        model_name=data['model_name'],
+        temperature=data['temperature'],
+        max_tokens=data['max_tokens'],
+        top_p=data['top_p']
+    )
+    return jsonify(result)
 
 @app.route('/apps/<app_id>/variables', methods=['POST'])
-@require_auth
 def add_variable(app_id):
     """Add variable to app"""
-    data = request.json
-    try:
-        result = client.add_variable(
-            app_id=app_id,
-            variable_name=data.get('variable_name'),
-            variable_type=data.get('variable_type', 'text-input'),
-            label=data.get('label', ''),
-            required=data.get('required', False),
-            max_length=data.get('max_length', 48)
-        )
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    data = _validate_add_variable(_request_body())
+    result = g.client.add_variable(
+        app_id=app_id,
+        variable_name=data['variable_name'],
+        variable_type=data['variable_type'],
+        label=data['label'],
+        required=data['required'],
+        max_length=data['max_length']
+    )
+    return jsonify(result)
+
+@app.route('/apps/<app_id>/variables/batch', methods=['POST'])
+def add_variables(app_id):
+    """Add several variables to app in one update"""
+    data = _validate_add_variables(_request_body())
+    variables = [
+        make_variable(item['variable_name'], item['variable_type'], item['label'],
+                      item['required'], item['max_length'])
+        for item in data
+    ]
+    result = g.client.add_variables(app_id=app_id, variables=variables)
+    return jsonify(result)
 
 @app.route('/apps/<app_id>/opening', methods=['PUT'])
-@require_auth
 def update_opening_statement(app_id):
     """Update opening statement"""
-    data = request.json
-    try:
-        result = client.update_opening_statement(
-            app_id=app_id,
-            opening_statement=data.get('opening_statement'),
-            suggested_questions=data.get('suggested_questions')
-        )
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    data = _validate_opening(_request_body())
+    result = g.client.update_opening_statement(
+        app_id=app_id,
+        opening_statement=data['opening_statement'],
+        suggested_questions=data.get('suggested_questions')
+    )
+    return jsonify(result)
 
 @app.route('/apps/<app_id>/knowledge', methods=['POST'])
-@require_auth
 def link_knowledge_base(app_id):
     """Link knowledge base to app"""
-    data = request.json
-    try:
-        result = client.link_knowledge_base(
-            app_id=app_id,
-            dataset_id=data.get('dataset_id'),
-            retrieval_model=data.get('retrieval_model', 'multiple')
-        )
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    data = _validate_knowledge(_request_body())
+    result = g.client.link_knowledge_base(
+        app_id=app_id,
+        dataset_id=data['dataset_id'],
+        retrieval_model=data['retrieval_model']
+    )
+    return jsonify(result)
 
 @app.route('/datasets', methods=['GET'])
-@require_auth
 def get_datasets():
     """Get all datasets"""
-    try:
-        result = client.get_datasets()
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    result = g.client.get_datasets()
+    return jsonify(result)
 
 @app.route('/datasets', methods=['POST'])
-@require_auth
 def create_dataset():
     """Create a new dataset"""
-    data = request.json
-    try:
-        result = client.create_dataset(
-            name=data.get('name'),
-            description=data.get('description', '')
-        )
-        return jsonify(result), 201
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    data = _validate_create_dataset(_request_body())
+    result = g.client.create_dataset(
+        name=data['name'],
+        description=data['description']
+    )
+    return jsonify(result), 201
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
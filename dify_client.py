@@ -4,25 +4,495 @@ Dify API Client Helper
 Interact with your Dify backend programmatically
 """
 
+import asyncio
+import copy
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import warnings
 import requests
 import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
 from typing import Optional, Dict, Any
 
+try:
+    import orjson
+except ImportError:  # optional speedup for large payloads
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # only needed for iter_workflow
+    ijson = None
+
+try:
+    from requests_toolbelt.multipart.encoder import MultipartEncoder
+except ImportError:  # uploads fall back to buffering the whole file
+    MultipartEncoder = None
+
+try:
+    import httpx
+except ImportError:  # only needed for the async (a*) methods
+    httpx = None
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+@lru_cache(maxsize=1024)
+def _app_url(apps_url: str, app_id: str, suffix: str = "") -> str:
+    """Build (and memoize) a per-app console URL"""
+    return f"{apps_url}/{app_id}{suffix}"
+
+
+def _model_settings_config(model_name: str, temperature: float, max_tokens: int,
+                           top_p: float) -> Dict[str, Any]:
+    """Build the partial model config sent by update_model_settings"""
+    return {
+        "model": {
+            "name": model_name,
+            "completion_params": {
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "top_p": top_p
+            }
+        }
+    }
+
+
+def _model_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Pick the update_model_settings fields out of a full model config"""
+    model = config.get('model') or {}
+    params = model.get('completion_params') or {}
+    return {
+        "model_name": model.get('name'),
+        "temperature": params.get('temperature'),
+        "max_tokens": params.get('max_tokens'),
+        "top_p": params.get('top_p')
+    }
+
+
+def _set_prompt(config: Dict[str, Any], prompt: str, mode: str):
+    """Put the prompt where the given app mode expects it"""
+    if mode == "chat":
+        config['prompt_template'] = prompt
+    else:
+        config['completion_params']['prompt'] = prompt
+
+
+def make_variable(variable_name: str, variable_type: str = "text-input", label: str = "",
+                  required: bool = False, max_length: int = 48) -> Dict[str, Any]:
+    """Build a user_input_form entry, with the same defaults as add_variable (for add_variables)"""
+    return {
+        "variable": variable_name,
+        "type": variable_type,
+        "label": label or variable_name,
+        "required": required,
+        "max_length": max_length
+    }
+
+
+def _raise_for_status(response, *args, **kwargs):
+    """Session response hook that raises HTTPError for 4xx/5xx responses"""
+    response.raise_for_status()
+
+
+def _araise_for_status(response):
+    """Raise requests.HTTPError for a 4xx/5xx httpx response, like the sync methods"""
+    if response.is_error:
+        kind = "Client" if response.status_code < 500 else "Server"
+        raise requests.HTTPError(
+            f"{response.status_code} {kind} Error: {response.reason_phrase} "
+            f"for url: {response.url}",
+            response=response
+        )
+
+
+class _TTLCache:
+    """Small LRU cache whose entries expire after `ttl` seconds"""
+    
+    def __init__(self, maxsize: int = 128, ttl: float = 5.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Return a copy of the cached value, or None if missing/expired"""
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+        # Callers mutate the returned dict before sending it back
+        return copy.deepcopy(value)
+    
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        entry = (time.monotonic() + self.ttl, copy.deepcopy(value))
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def idempotency_key(app_id: str, payload: Any) -> str:
+    """Stable key identifying `payload` applied to `app_id`, for Idempotency-Key headers"""
+    body = json.dumps(payload, sort_keys=True)
+    return hashlib.blake2b(f"{app_id}:{body}".encode(), digest_size=16).hexdigest()
+
+
+class AppliedUpdates:
+    """
+    On-disk set of idempotency keys whose updates have already succeeded
+    
+    Entries older than `max_age` seconds are treated as absent, matching the
+    window in which a server would still deduplicate a repeated key.
+    """
+    
+    def __init__(self, path: str = "~/.dify-cli/applied.sqlite", max_age: float = 86400.0):
+        self.max_age = max_age
+        path = os.path.expanduser(path)
+        directory = os.path.dirname(path)
+        if path != ":memory:" and directory:
+            os.makedirs(directory, exist_ok=True)
+        # Shared by bulk worker threads; access is serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS applied (key TEXT PRIMARY KEY, applied_at REAL)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+    
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM applied WHERE key = ? AND applied_at >= ?",
+                (key, time.time() - self.max_age)
+            ).fetchone()
+        return row is not None
+    
+    def add(self, key: str):
+        self.add_many([key])
+    
+    def add_many(self, keys: list):
+        """Record several keys in one transaction"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO applied VALUES (?, ?)",
+                                   [(key, now) for key in keys])
+            self._conn.commit()
+    
+    def close(self):
+        self._conn.close()
+
+
+class RateLimiter:
+    """
+    Async token bucket that adapts to server throttling (AIMD)
+    
+    The rate is halved when the server answers 429 and grows by one
+    request/second for every second without throttling, up to max_rate.
+    429s answering the same burst count as one decrease: further ones are
+    ignored for a second (or the Retry-After pause) after each halving.
+    """
+    
+    def __init__(self, rate: float = 10.0, burst: int = 10,
+                 min_rate: float = 0.5, max_rate: float = 50.0):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._last_increase = self._updated
+        self._paused_until = 0.0
+        self._hold_decrease_until = 0.0
+        self._lock = asyncio.Lock()
+    
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    async def acquire(self, cost: float = 1):
+        """Wait until `cost` tokens are available and take them"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= cost:
+                    self._tokens -= cost
+                    return
+                await asyncio.sleep((cost - self._tokens) / self.rate)
+    
+    def succeeded(self):
+        """Additive increase after each throttle-free second"""
+        now = time.monotonic()
+        if now - self._last_increase >= 1.0:
+            self.rate = min(self.max_rate, self.rate + 1)
+            self._last_increase = now
+    
+    def throttled(self, retry_after: Optional[float] = None):
+        """Multiplicative decrease, pausing for Retry-After if the server sent one"""
+        now = time.monotonic()
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        if now < self._hold_decrease_until:
+            return
+        self._hold_decrease_until = now + max(1.0, retry_after or 0.0)
+        self.rate = max(self.min_rate, self.rate * 0.5)
+        self._tokens = 0.0
+        self._updated = now
+        self._last_increase = now
+
+
+def _retry_after(response) -> Optional[float]:
+    """Parse a Retry-After header given in seconds"""
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
 class DifyClient:
-    def __init__(self, base_url: str, api_key: Optional[str] = None):
+    def __init__(self, base_url: str, api_key: Optional[str] = None,
+                 cache_ttl: float = 5.0):
         """
         Initialize Dify API Client
         
         Args:
             base_url: Base URL of your Dify instance (e.g., https://api-production-50f6.up.railway.app)
             api_key: Optional API key for authentication
+            cache_ttl: Seconds to cache app parameters/model config reads (0 disables)
         """
         self.base_url = base_url.rstrip('/')
         self.console_api = f"{self.base_url}/console/api"
         self.public_api = f"{self.base_url}/api"
+        self._apps_url = f"{self.console_api}/apps"
         self.api_key = api_key
         self.session = requests.Session()
+        # Separate session for the public API so the per-request app key
+        # doesn't collide with the console Bearer token
+        self.public_session = requests.Session()
+        
+        # Retry transient upstream failures with backoff. POST is left out
+        # because create_app/create_dataset aren't safe to replay.
+        retries = Retry(
+            total=3,
+            backoff_factor=0.2,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=frozenset(['GET', 'PUT', 'DELETE']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=20, pool_maxsize=100, max_retries=retries)
+        for session in (self.session, self.public_session):
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.hooks['response'].append(_raise_for_status)
+            # Ask for compressed responses; urllib3 only lists 'br' when
+            # brotli is installed, so it never accepts what it can't decode
+            session.headers.update({
+                'Accept-Encoding': ACCEPT_ENCODING,
+                'User-Agent': 'dify-client/1.0'
+            })
+        
+        # Short-lived caches so batched mutations on one app skip repeated GETs
+        self._param_cache = _TTLCache(ttl=cache_ttl)
+        self._config_cache = _TTLCache(ttl=cache_ttl)
+        # Raw body + validators of small metadata reads, revalidated with
+        # conditional GETs. Bytes are kept so hits skip the dict deepcopy.
+        self._etag_cache = _TTLCache(maxsize=256, ttl=float('inf'))
+        
+        # Created on first use of an async (a*) method
+        self._aclient = None
+        # Optional RateLimiter applied to async requests
+        self.rate_limiter = None
+        # Set to False once the server turns out not to have a batch endpoint
+        self._batch_model_config = True
+        
+    @staticmethod
+    def _parse(response: requests.Response) -> Any:
+        """Decode a JSON response body, using orjson when available"""
+        if orjson is not None:
+            return orjson.loads(response.content)
+        return response.json()
+    
+    @staticmethod
+    def _loads(content: bytes) -> Any:
+        """Decode a raw JSON body, using orjson when available"""
+        if orjson is not None:
+            return orjson.loads(content)
+        return json.loads(content)
+    
+    def _post_json(self, url: str, payload: Any,
+                   headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """POST a JSON body, encoding it with orjson when available"""
+        if orjson is not None:
+            return self.session.post(url, data=orjson.dumps(payload),
+                                     headers={**(headers or {}), 'Content-Type': 'application/json'})
+        return self.session.post(url, json=payload, headers=headers)
+    
+    def _conditional_headers(self, url: str):
+        """Return (validator headers, cached raw body) for a previously fetched URL"""
+        cached = self._etag_cache.get(url)
+        if cached is None:
+            return {}, None
+        return cached
+    
+    def _remember(self, url: str, response):
+        """Store the raw body of a response that carries cache validators"""
+        validators = {}
+        if 'ETag' in response.headers:
+            validators['If-None-Match'] = response.headers['ETag']
+        if 'Last-Modified' in response.headers:
+            validators['If-Modified-Since'] = response.headers['Last-Modified']
+        if validators:
+            self._etag_cache.set(url, (validators, response.content))
+    
+    def _get(self, url: str, revalidate: bool = False) -> Any:
+        """
+        GET a console resource
+        
+        Args:
+            url: Resource URL
+            revalidate: Cache the body and revalidate it via ETag/Last-Modified
+                        (meant for small metadata reads, not large bodies)
+        """
+        if not revalidate:
+            return self._parse(self.session.get(url))
+        headers, cached = self._conditional_headers(url)
+        response = self.session.get(url, headers=headers)
+        if response.status_code == 304 and cached is not None:
+            return self._loads(cached)
+        self._remember(url, response)
+        return self._parse(response)
+    
+    async def _aget(self, url: str, revalidate: bool = False) -> Any:
+        """Async version of _get"""
+        headers, cached = self._conditional_headers(url) if revalidate else ({}, None)
+        headers = {**self.session.headers, **headers}
+        response = await self._asend('GET', url, headers=headers)
+        if response.status_code == 304 and cached is not None:
+            return self._loads(cached)
+        _araise_for_status(response)
+        if revalidate:
+            self._remember(url, response)
+        return self._parse(response)
+    
+    def _get_async_client(self) -> "httpx.AsyncClient":
+        """Return the async HTTP client, creating it on first use"""
+        if httpx is None:
+            raise ImportError("async methods require the 'httpx' package")
+        if self._aclient is None:
+            # httpx only negotiates HTTP/2 over TLS (ALPN), so plain http://
+            # URLs keep the default HTTP/1.1 pool, one socket per request
+            if _HTTP2 and self.base_url.startswith('https://'):
+                # Concurrent requests are multiplexed as streams over a few
+                # connections; the cap stays above the bulk concurrency in case
+                # the server lacks h2 and httpx falls back to HTTP/1.1
+                self._aclient = httpx.AsyncClient(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=16, max_keepalive_connections=4),
+                    timeout=30
+                )
+            else:
+                self._aclient = httpx.AsyncClient(timeout=30)
+        return self._aclient
+    
+    async def _arequest(self, method: str, url: str, payload: Any = None,
+                        headers: Optional[Dict[str, str]] = None) -> Any:
+        """Send a console API request on the async client and decode the response"""
+        # Read headers per request so a later login() is picked up
+        headers = {**self.session.headers, **(headers or {})}
+        kwargs = {}
+        if payload is not None:
+            if orjson is not None:
+                kwargs['content'] = orjson.dumps(payload)
+                headers['Content-Type'] = 'application/json'
+            else:
+                kwargs['json'] = payload
+        response = await self._asend(method, url, headers=headers, **kwargs)
+        _araise_for_status(response)
+        return self._parse(response)
+    
+    async def _asend(self, method: str, url: str, max_throttle_retries: int = 3,
+                     **kwargs) -> "httpx.Response":
+        """Send on the async client, pacing through rate_limiter when one is set"""
+        client = self._get_async_client()
+        limiter = self.rate_limiter
+        if limiter is None:
+            return await client.request(method, url, **kwargs)
+        for _ in range(max_throttle_retries):
+            await limiter.acquire()
+            response = await client.request(method, url, **kwargs)
+            if response.status_code != 429:
+                limiter.succeeded()
+                return response
+            # A 429 was rejected before any work was done, so it's safe to resend
+            limiter.throttled(_retry_after(response))
+        await limiter.acquire()
+        return await client.request(method, url, **kwargs)
+    
+    async def aclose(self):
+        """Close the async HTTP client; it is recreated on next use"""
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
+    
+    def close(self):
+        """
+        Close the pooled HTTP connections
         
+        The async client can only be closed from a coroutine: use
+        `async with DifyClient(...)` or await aclose() first.
+        """
+        self.session.close()
+        self.public_session.close()
+        if self._aclient is not None:
+            warnings.warn("DifyClient closed with its async client still open; "
+                          "await aclose() first", ResourceWarning, stacklevel=2)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+        self.close()
+    
     def set_api_key(self, api_key: str):
         """Set or update the API key"""
         self.api_key = api_key
@@ -44,7 +514,6 @@ class DifyClient:
             "password": password
         }
         response = self.session.post(url, json=payload)
-        response.raise_for_status()
         data = response.json()
         
         # Store the access token
@@ -52,22 +521,70 @@ class DifyClient:
             self.session.headers.update({
                 'Authorization': f"Bearer {data['data']['access_token']}"
             })
+            # Cached responses belong to the previous account
+            self._etag_cache.clear()
+            self._param_cache.clear()
+            self._config_cache.clear()
         
         return data
     
     def get_apps(self) -> Dict[str, Any]:
         """Get list of all apps"""
-        url = f"{self.console_api}/apps"
-        response = self.session.get(url)
-        response.raise_for_status()
-        return response.json()
+        url = self._apps_url
+        return self._get(url, revalidate=True)
+    
+    def iter_apps(self, page_size: int = 100):
+        """
+        Iterate over all apps, fetching one page at a time
+        
+        Args:
+            page_size: Number of apps requested per page
+            
+        Yields:
+            App dicts
+        """
+        page = 1
+        while True:
+            data = self._get(f"{self._apps_url}?page={page}&limit={page_size}")
+            yield from data.get('data', [])
+            if not data.get('has_more'):
+                return
+            page += 1
+    
+    async def aiter_apps(self, page_size: int = 100):
+        """Async version of iter_apps"""
+        page = 1
+        while True:
+            data = await self._aget(f"{self._apps_url}?page={page}&limit={page_size}")
+            for app in data.get('data', []):
+                yield app
+            if not data.get('has_more'):
+                return
+            page += 1
     
     def get_app_detail(self, app_id: str) -> Dict[str, Any]:
         """Get details of a specific app"""
-        url = f"{self.console_api}/apps/{app_id}"
-        response = self.session.get(url)
-        response.raise_for_status()
-        return response.json()
+        url = _app_url(self._apps_url, app_id)
+        return self._get(url, revalidate=True)
+    
+    async def aget_app_detail(self, app_id: str) -> Dict[str, Any]:
+        """Async version of get_app_detail"""
+        url = _app_url(self._apps_url, app_id)
+        return await self._aget(url, revalidate=True)
+    
+    def get_app_details_bulk(self, app_ids: list, max_workers: int = 8) -> list:
+        """
+        Get details of several apps concurrently
+        
+        Args:
+            app_ids: List of app IDs
+            max_workers: Maximum number of requests in flight (keep <= pool size)
+            
+        Returns:
+            List of app details in the same order as app_ids
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.get_app_detail, app_ids))
     
     def create_app(self, name: str, mode: str = "chat", icon: str = "🤖", 
                    description: str = "") -> Dict[str, Any]:
@@ -80,7 +597,7 @@ class DifyClient:
             icon: App icon emoji
             description: App description
         """
-        url = f"{self.console_api}/apps"
+        url = self._apps_url
         payload = {
             "name": name,
             "mode": mode,
@@ -88,38 +605,92 @@ class DifyClient:
             "description": description
         }
         response = self.session.post(url, json=payload)
-        response.raise_for_status()
         return response.json()
     
-    def update_app_config(self, app_id: str, config: Dict[str, Any]) -> Dict[str, Any]:
-        """Update app model configuration"""
-        url = f"{self.console_api}/apps/{app_id}/model-config"
-        response = self.session.post(url, json=config)
-        response.raise_for_status()
+    def update_app_config(self, app_id: str, config: Dict[str, Any],
+                          idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Update app model configuration
+        
+        Args:
+            app_id: App ID
+            config: Model config (full, or partial to merge server-side)
+            idempotency_key: Optional Idempotency-Key header (see idempotency_key())
+        """
+        url = _app_url(self._apps_url, app_id, "/model-config")
+        headers = {'Idempotency-Key': idempotency_key} if idempotency_key else None
+        response = self._post_json(url, config, headers)
+        # Partial configs (e.g. model settings) are merged server-side,
+        # so the cached copy can't be patched locally
+        self._config_cache.pop(app_id)
         return response.json()
     
+    async def aupdate_app_config(self, app_id: str, config: Dict[str, Any],
+                                 idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """Async version of update_app_config"""
+        url = _app_url(self._apps_url, app_id, "/model-config")
+        headers = {'Idempotency-Key': idempotency_key} if idempotency_key else None
+        result = await self._arequest('POST', url, config, headers)
+        self._config_cache.pop(app_id)
+        return result
+    
     def get_app_parameters(self, app_id: str) -> Dict[str, Any]:
         """Get app parameters and configuration"""
-        url = f"{self.console_api}/apps/{app_id}/parameters"
-        response = self.session.get(url)
-        response.raise_for_status()
-        return response.json()
+        cached = self._param_cache.get(app_id)
+        if cached is not None:
+            return cached
+        url = _app_url(self._apps_url, app_id, "/parameters")
+        data = self._get(url, revalidate=True)
+        self._param_cache.set(app_id, data)
+        return data
+    
+    async def aget_app_parameters(self, app_id: str) -> Dict[str, Any]:
+        """Async version of get_app_parameters"""
+        cached = self._param_cache.get(app_id)
+        if cached is not None:
+            return cached
+        url = _app_url(self._apps_url, app_id, "/parameters")
+        data = await self._aget(url, revalidate=True)
+        self._param_cache.set(app_id, data)
+        return data
     
     def update_app_parameters(self, app_id: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """Update app parameters (variables, opening statement, etc.)"""
-        url = f"{self.console_api}/apps/{app_id}/parameters"
-        response = self.session.post(url, json=parameters)
-        response.raise_for_status()
+        url = _app_url(self._apps_url, app_id, "/parameters")
+        response = self._post_json(url, parameters)
+        # Parameters are always sent in full, so the payload is the new state
+        self._param_cache.set(app_id, parameters)
         return response.json()
     
+    async def aupdate_app_parameters(self, app_id: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """Async version of update_app_parameters"""
+        url = _app_url(self._apps_url, app_id, "/parameters")
+        result = await self._arequest('POST', url, parameters)
+        self._param_cache.set(app_id, parameters)
+        return result
+    
     def get_prompt_config(self, app_id: str) -> Dict[str, Any]:
         """Get current prompt configuration"""
-        url = f"{self.console_api}/apps/{app_id}/model-config"
-        response = self.session.get(url)
-        response.raise_for_status()
-        return response.json()
+        cached = self._config_cache.get(app_id)
+        if cached is not None:
+            return cached
+        url = _app_url(self._apps_url, app_id, "/model-config")
+        data = self._get(url, revalidate=True)
+        self._config_cache.set(app_id, data)
+        return data
     
-    def update_prompt(self, app_id: str, prompt: str, mode: str = "chat") -> Dict[str, Any]:
+    async def aget_prompt_config(self, app_id: str) -> Dict[str, Any]:
+        """Async version of get_prompt_config"""
+        cached = self._config_cache.get(app_id)
+        if cached is not None:
+            return cached
+        url = _app_url(self._apps_url, app_id, "/model-config")
+        data = await self._aget(url, revalidate=True)
+        self._config_cache.set(app_id, data)
+        return data
+    
+    def update_prompt(self, app_id: str, prompt: str, mode: str = "chat",
+                      base_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Update app prompt/instructions
         
@@ -127,21 +698,52 @@ class DifyClient:
             app_id: App ID
             prompt: New prompt text
             mode: App mode (chat, completion, etc.)
+            base_config: Full model config to update; skips fetching the current one
         """
-        # Get current config first
-        current_config = self.get_prompt_config(app_id)
-        
-        # Update the prompt
-        if mode == "chat":
-            current_config['prompt_template'] = prompt
+        # Get current config first (served from cache after a recent read)
+        if base_config is not None:
+            current_config = copy.deepcopy(base_config)
         else:
-            current_config['completion_params']['prompt'] = prompt
+            current_config = self.get_prompt_config(app_id)
         
+        _set_prompt(current_config, prompt, mode)
         return self.update_app_config(app_id, current_config)
     
+    async def aupdate_prompt(self, app_id: str, prompt: str, mode: str = "chat",
+                             base_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Async version of update_prompt"""
+        if base_config is not None:
+            current_config = copy.deepcopy(base_config)
+        else:
+            current_config = await self.aget_prompt_config(app_id)
+        _set_prompt(current_config, prompt, mode)
+        return await self.aupdate_app_config(app_id, current_config)
+    
+    def bulk_update_prompt(self, app_id_to_prompt: Dict[str, str], mode: str = "chat",
+                           max_workers: int = 8) -> Dict[str, Any]:
+        """
+        Update the prompt of several apps concurrently
+        
+        Args:
+            app_id_to_prompt: Mapping of app ID to new prompt text
+            mode: App mode (chat, completion, etc.)
+            max_workers: Maximum number of apps updated at once
+            
+        Returns:
+            Mapping of app ID to update response
+        """
+        app_ids = list(app_id_to_prompt)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(
+                lambda app_id: self.update_prompt(app_id, app_id_to_prompt[app_id], mode),
+                app_ids
+            )
+            return dict(zip(app_ids, results))
+    
     def update_model_settings(self, app_id: str, model_name: str, 
                              temperature: float = 0.7, max_tokens: int = 2048,
-                             top_p: float = 1.0) -> Dict[str, Any]:
+                             top_p: float = 1.0,
+                             idempotency_key: Optional[str] = None) -> Dict[str, Any]:
         """
         Update model settings (model, temperature, max tokens, etc.)
         
@@ -151,18 +753,51 @@ class DifyClient:
             temperature: Sampling temperature (0-2)
             max_tokens: Maximum tokens to generate
             top_p: Nucleus sampling parameter
+            idempotency_key: Optional Idempotency-Key header (see idempotency_key())
         """
-        config = {
-            "model": {
-                "name": model_name,
-                "completion_params": {
-                    "temperature": temperature,
-                    "max_tokens": max_tokens,
-                    "top_p": top_p
-                }
-            }
-        }
-        return self.update_app_config(app_id, config)
+        config = _model_settings_config(model_name, temperature, max_tokens, top_p)
+        return self.update_app_config(app_id, config, idempotency_key)
+    
+    def get_model_settings(self, app_id: str) -> Dict[str, Any]:
+        """Get current model settings (model_name, temperature, max_tokens, top_p)"""
+        return _model_settings(self.get_prompt_config(app_id))
+    
+    async def aget_model_settings(self, app_id: str) -> Dict[str, Any]:
+        """Async version of get_model_settings"""
+        return _model_settings(await self.aget_prompt_config(app_id))
+    
+    def bulk_update_model_settings(self, updates: list) -> Optional[Dict[str, Any]]:
+        """
+        Update model settings of several apps in a single request
+        
+        Args:
+            updates: List of dicts with app_id, model, temperature, max_tokens
+                     (and optionally top_p)
+            
+        Returns:
+            Batch response, or None if the server has no batch endpoint
+        """
+        if not self._batch_model_config:
+            return None
+        url = f"{self._apps_url}/batch/model-config"
+        try:
+            response = self._post_json(url, updates)
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code in (404, 405):
+                self._batch_model_config = False
+                return None
+            raise
+        for update in updates:
+            self._config_cache.pop(update['app_id'])
+        return self._parse(response)
+    
+    async def aupdate_model_settings(self, app_id: str, model_name: str,
+                                     temperature: float = 0.7, max_tokens: int = 2048,
+                                     top_p: float = 1.0,
+                                     idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """Async version of update_model_settings"""
+        config = _model_settings_config(model_name, temperature, max_tokens, top_p)
+        return await self.aupdate_app_config(app_id, config, idempotency_key)
     
     def add_variable(self, app_id: str, variable_name: str, variable_type: str = "text-input",
                     label: str = "", required: bool = False, max_length: int = 48) -> Dict[str, Any]:
@@ -177,22 +812,52 @@ class DifyClient:
             required: Whether variable is required
             max_length: Maximum length for text inputs
         """
-        params = self.get_app_parameters(app_id)
-        
-        new_variable = {
-            "variable": variable_name,
-            "type": variable_type,
-            "label": label or variable_name,
-            "required": required,
-            "max_length": max_length
-        }
+        new_variable = make_variable(variable_name, variable_type, label, required, max_length)
+        return self.add_variables(app_id, [new_variable])
+    
+    async def aadd_variable(self, app_id: str, variable_name: str, variable_type: str = "text-input",
+                            label: str = "", required: bool = False,
+                            max_length: int = 48) -> Dict[str, Any]:
+        """Async version of add_variable"""
+        new_variable = make_variable(variable_name, variable_type, label, required, max_length)
+        return await self.aadd_variables(app_id, [new_variable])
+    
+    def add_variables(self, app_id: str, variables: list) -> Dict[str, Any]:
+        """
+        Add several user input variables with a single parameters update
         
-        if 'user_input_form' not in params:
-            params['user_input_form'] = []
+        Args:
+            app_id: App ID
+            variables: List of variable dicts (variable, type, label, required, max_length)
+        """
+        params = self.get_app_parameters(app_id)
+        params.setdefault('user_input_form', []).extend(variables)
+        return self.update_app_parameters(app_id, params)
+    
+    async def aadd_variables(self, app_id: str, variables: list) -> Dict[str, Any]:
+        """Async version of add_variables"""
+        params = await self.aget_app_parameters(app_id)
+        params.setdefault('user_input_form', []).extend(variables)
+        return await self.aupdate_app_parameters(app_id, params)
+    
+    def set_variables(self, app_id: str, variables: list) -> Dict[str, Any]:
+        """
+        Replace all user input variables with a single parameters update
         
-        params['user_input_form'].append(new_variable)
+        Args:
+            app_id: App ID
+            variables: Complete list of variable dicts (variable, type, label, required, max_length)
+        """
+        params = self.get_app_parameters(app_id)
+        params['user_input_form'] = list(variables)
         return self.update_app_parameters(app_id, params)
     
+    async def aset_variables(self, app_id: str, variables: list) -> Dict[str, Any]:
+        """Async version of set_variables"""
+        params = await self.aget_app_parameters(app_id)
+        params['user_input_form'] = list(variables)
+        return await self.aupdate_app_parameters(app_id, params)
+    
     def update_opening_statement(self, app_id: str, opening_statement: str,
                                 suggested_questions: list = None) -> Dict[str, Any]:
         """
@@ -211,12 +876,38 @@ class DifyClient:
         
         return self.update_app_parameters(app_id, params)
     
+    async def aupdate_opening_statement(self, app_id: str, opening_statement: str,
+                                        suggested_questions: list = None) -> Dict[str, Any]:
+        """Async version of update_opening_statement"""
+        params = await self.aget_app_parameters(app_id)
+        params['opening_statement'] = opening_statement
+        
+        if suggested_questions:
+            params['suggested_questions'] = suggested_questions
+        
+        return await self.aupdate_app_parameters(app_id, params)
+    
     def get_workflow(self, app_id: str) -> Dict[str, Any]:
         """Get workflow configuration for workflow apps"""
-        url = f"{self.console_api}/apps/{app_id}/workflows/draft"
-        response = self.session.get(url)
-        response.raise_for_status()
-        return response.json()
+        url = _app_url(self._apps_url, app_id, "/workflows/draft")
+        return self._get(url)
+    
+    def iter_workflow(self, app_id: str):
+        """
+        Stream workflow nodes one at a time without loading the whole graph
+        
+        Args:
+            app_id: App ID
+            
+        Yields:
+            Workflow node dicts
+        """
+        if ijson is None:
+            raise ImportError("iter_workflow requires the 'ijson' package")
+        url = _app_url(self._apps_url, app_id, "/workflows/draft")
+        with self.session.get(url, stream=True) as response:
+            response.raw.decode_content = True
+            yield from ijson.items(response.raw, 'graph.nodes.item')
     
     def update_workflow(self, app_id: str, workflow_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -226,16 +917,14 @@ class DifyClient:
             app_id: App ID
             workflow_data: Complete workflow configuration
         """
-        url = f"{self.console_api}/apps/{app_id}/workflows/draft"
-        response = self.session.post(url, json=workflow_data)
-        response.raise_for_status()
-        return response.json()
+        url = _app_url(self._apps_url, app_id, "/workflows/draft")
+        response = self._post_json(url, workflow_data)
+        return self._parse(response)
     
     def publish_workflow(self, app_id: str) -> Dict[str, Any]:
         """Publish workflow changes"""
-        url = f"{self.console_api}/apps/{app_id}/workflows/publish"
+        url = _app_url(self._apps_url, app_id, "/workflows/publish")
         response = self.session.post(url, json={})
-        response.raise_for_status()
         return response.json()
     
     def add_tool_to_app(self, app_id: str, tool_name: str, tool_config: Dict[str, Any]) -> Dict[str, Any]:
@@ -269,26 +958,26 @@ class DifyClient:
             dataset_id: Dataset/knowledge base ID
             retrieval_model: Retrieval mode (single, multiple)
         """
-        url = f"{self.console_api}/apps/{app_id}/datasets"
+        url = _app_url(self._apps_url, app_id, "/datasets")
         payload = {
             "datasets": [{
                 "dataset_id": dataset_id,
                 "retrieval_model": retrieval_model
             }]
         }
-        response = self.session.post(url, json=payload)
-        response.raise_for_status()
+        response = self._post_json(url, payload)
         return response.json()
     
     def delete_app(self, app_id: str) -> Dict[str, Any]:
         """Delete an app"""
-        url = f"{self.console_api}/apps/{app_id}"
+        url = _app_url(self._apps_url, app_id)
         response = self.session.delete(url)
-        response.raise_for_status()
+        self._param_cache.pop(app_id)
+        self._config_cache.pop(app_id)
         return response.json()
     
-    def rename_app(self, app_id: str, new_name: str, icon: str = None, 
-                  description: str = None) -> Dict[str, Any]:
+    def rename_app(self, app_id: str, new_name: str, icon: Optional[str] = None, 
+                  description: Optional[str] = None) -> Dict[str, Any]:
         """
         Rename app and update metadata
         
@@ -298,24 +987,18 @@ class DifyClient:
             icon: New icon emoji (optional)
             description: New description (optional)
         """
-        url = f"{self.console_api}/apps/{app_id}"
-        payload = {"name": new_name}
-        
-        if icon:
-            payload["icon"] = icon
-        if description:
-            payload["description"] = description
+        url = _app_url(self._apps_url, app_id)
+        # Only skip fields that weren't given, so description="" clears it
+        payload = {k: v for k, v in (("name", new_name), ("icon", icon),
+                                     ("description", description)) if v is not None}
         
         response = self.session.put(url, json=payload)
-        response.raise_for_status()
         return response.json()
     
     def get_datasets(self) -> Dict[str, Any]:
         """Get list of all datasets/knowledge bases"""
         url = f"{self.console_api}/datasets"
-        response = self.session.get(url)
-        response.raise_for_status()
-        return response.json()
+        return self._get(url)
     
     def create_dataset(self, name: str, description: str = "") -> Dict[str, Any]:
         """Create a new dataset/knowledge base"""
@@ -325,16 +1008,22 @@ class DifyClient:
             "description": description
         }
         response = self.session.post(url, json=payload)
-        response.raise_for_status()
         return response.json()
     
     def upload_document(self, dataset_id: str, file_path: str) -> Dict[str, Any]:
         """Upload a document to a dataset"""
         url = f"{self.console_api}/datasets/{dataset_id}/documents"
         with open(file_path, 'rb') as f:
-            files = {'file': f}
-            response = self.session.post(url, files=files)
-        response.raise_for_status()
+            if MultipartEncoder is not None:
+                # Stream the multipart body so memory use doesn't grow with file size
+                encoder = MultipartEncoder(fields={
+                    'file': (os.path.basename(file_path), f, 'application/octet-stream')
+                })
+                response = self.session.post(url, data=encoder,
+                                             headers={'Content-Type': encoder.content_type})
+            else:
+                files = {'file': f}
+                response = self.session.post(url, files=files)
         return response.json()
     
     def chat_completion(self, app_key: str, query: str, user: str = "user",
@@ -361,8 +1050,7 @@ class DifyClient:
         if conversation_id:
             payload["conversation_id"] = conversation_id
             
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
+        response = self.public_session.post(url, headers=headers, json=payload)
         return response.json()
     
     def get_conversations(self, app_key: str, user: str = "user") -> Dict[str, Any]:
@@ -372,8 +1060,7 @@ class DifyClient:
             'Authorization': f'Bearer {app_key}',
         }
         params = {'user': user}
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
+        response = self.public_session.get(url, headers=headers, params=params)
         return response.json()
 
 
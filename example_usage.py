@@ -4,13 +4,18 @@ Example usage of Dify API Client
 """
 
 import os
-from dotenv import load_dotenv
 from dify_client import DifyClient
 
-# Load environment variables
-load_dotenv()
+try:
+    from dotenv import load_dotenv
+except ImportError:  # env vars can come straight from the shell
+    def load_dotenv():
+        return False
 
 def main():
+    # Load environment variables
+    load_dotenv()
+    
     # Initialize client
     api_url = os.getenv('DIFY_API_URL', 'https://api-production-50f6.up.railway.app')
     client = DifyClient(api_url)
@@ -3,14 +3,50 @@
 Examples of programmatically modifying Dify apps
 """
 
+import asyncio
+import logging
 import os
-from dotenv import load_dotenv
-from dify_client import DifyClient
+import queue
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+from dify_client import DifyClient, RateLimiter, AppliedUpdates, idempotency_key, make_variable
+
+try:
+    import httpx  # noqa: F401  (the async examples need it)
+except ImportError:
+    httpx = None
+
+try:
+    from dotenv import load_dotenv
+except ImportError:  # env vars can come straight from the shell
+    def load_dotenv():
+        return False
+
+# All example output goes through this logger. By default it prints straight
+# to stdout like print() did; when run as a script it is queued instead so
+# concurrent tasks never block on stdout (see _start_logging).
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_stdout_handler = logging.StreamHandler(sys.stdout)
+_stdout_handler.setFormatter(logging.Formatter("%(message)s"))
+logger.addHandler(_stdout_handler)
+
+
+def _start_logging():
+    """Print the logger's records from a background thread; returns the listener"""
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, _stdout_handler)
+    logger.removeHandler(_stdout_handler)
+    logger.addHandler(QueueHandler(log_queue))
+    listener.start()
+    return listener
 
-load_dotenv()
 
 def setup_client():
     """Initialize and login to Dify"""
+    load_dotenv()
     client = DifyClient(os.getenv('DIFY_API_URL', 'https://api-production-50f6.up.railway.app'))
     client.login(
         os.getenv('DIFY_EMAIL'),
@@ -38,9 +74,9 @@ Guidelines:
 - Provide examples when helpful
 """
     
-    print("Updating app prompt...")
+    logger.info("Updating app prompt...")
     result = client.update_prompt(app_id, new_prompt, mode="chat")
-    print(f"✓ Prompt updated successfully!")
+    logger.info(f"✓ Prompt updated successfully!")
     return result
 
 
@@ -50,7 +86,7 @@ Guidelines:
 def update_model_settings_example(client, app_id):
     """Change the AI model and its parameters"""
     
-    print("Updating model settings...")
+    logger.info("Updating model settings...")
     result = client.update_model_settings(
         app_id=app_id,
         model_name="gpt-4",  # or "claude-3-sonnet", "gpt-3.5-turbo", etc.
@@ -58,7 +94,7 @@ def update_model_settings_example(client, app_id):
         max_tokens=2048,      # Maximum response length
         top_p=0.9            # Nucleus sampling
     )
-    print(f"✓ Model settings updated!")
+    logger.info(f"✓ Model settings updated!")
     return result
 
 
@@ -68,29 +104,29 @@ def update_model_settings_example(client, app_id):
 def add_variables_example(client, app_id):
     """Add custom input fields for users"""
     
-    print("Adding user input variables...")
-    
-    # Add a text input for user's name
-    client.add_variable(
-        app_id=app_id,
-        variable_name="user_name",
-        variable_type="text-input",
-        label="Your Name",
-        required=True,
-        max_length=50
-    )
-    
-    # Add a paragraph input for detailed questions
-    client.add_variable(
-        app_id=app_id,
-        variable_name="question_details",
-        variable_type="paragraph",
-        label="Describe your question in detail",
-        required=False,
-        max_length=500
-    )
+    logger.info("Adding user input variables...")
+    
+    # Add both variables with a single parameters update
+    client.add_variables(app_id, [
+        # Text input for user's name
+        {
+            "variable": "user_name",
+            "type": "text-input",
+            "label": "Your Name",
+            "required": True,
+            "max_length": 50
+        },
+        # Paragraph input for detailed questions
+        {
+            "variable": "question_details",
+            "type": "paragraph",
+            "label": "Describe your question in detail",
+            "required": False,
+            "max_length": 500
+        }
+    ])
     
-    print(f"✓ Variables added!")
+    logger.info(f"✓ Variables added!")
 
 
 # ============================================================================
@@ -108,13 +144,13 @@ def update_opening_statement_example(client, app_id):
         "What are your pricing plans?"
     ]
     
-    print("Updating opening statement...")
+    logger.info("Updating opening statement...")
     result = client.update_opening_statement(
         app_id=app_id,
         opening_statement=opening_statement,
         suggested_questions=suggested_questions
     )
-    print(f"✓ Opening statement updated!")
+    logger.info(f"✓ Opening statement updated!")
     return result
 
 
@@ -124,13 +160,13 @@ def update_opening_statement_example(client, app_id):
 def link_knowledge_base_example(client, app_id, dataset_id):
     """Connect a knowledge base to your app for RAG"""
     
-    print("Linking knowledge base to app...")
+    logger.info("Linking knowledge base to app...")
     result = client.link_knowledge_base(
         app_id=app_id,
         dataset_id=dataset_id,
         retrieval_model="multiple"  # or "single" for single document retrieval
     )
-    print(f"✓ Knowledge base linked!")
+    logger.info(f"✓ Knowledge base linked!")
     return result
 
 
@@ -140,7 +176,7 @@ def link_knowledge_base_example(client, app_id, dataset_id):
 def add_tool_example(client, app_id):
     """Add external tools or plugins to your app"""
     
-    print("Adding tool to app...")
+    logger.info("Adding tool to app...")
     
     # Example: Add a web search tool
     tool_config = {
@@ -156,7 +192,7 @@ def add_tool_example(client, app_id):
         tool_name="web_search",
         tool_config=tool_config
     )
-    print(f"✓ Tool added!")
+    logger.info(f"✓ Tool added!")
     return result
 
 
@@ -166,29 +202,89 @@ def add_tool_example(client, app_id):
 def rename_app_example(client, app_id):
     """Change app name, icon, and description"""
     
-    print("Renaming app...")
+    logger.info("Renaming app...")
     result = client.rename_app(
         app_id=app_id,
         new_name="Customer Support Bot v2",
         icon="🤖",
         description="AI-powered customer support assistant with knowledge base integration"
     )
-    print(f"✓ App renamed!")
+    logger.info(f"✓ App renamed!")
     return result
 
 
 # ============================================================================
 # EXAMPLE 8: Complete App Setup from Scratch
 # ============================================================================
+_RECOMMENDATION_PROMPT = (
+    "You are a product recommendation expert. Help users find products that match their needs.\n"
+    "\n"
+    "Ask clarifying questions about:\n"
+    "- Budget\n"
+    "- Use case\n"
+    "- Preferences\n"
+    "- Must-have features\n"
+    "\n"
+    "Then provide 3-5 personalized recommendations with explanations."
+)
+
+
+async def _configure_model(client, app_id, prompt):
+    """Steps 2-3: prompt and model both write the model config, so run in order"""
+    await client.aupdate_prompt(app_id, prompt)
+    logger.info("   ✓ Prompt configured")
+    
+    await client.aupdate_model_settings(
+        app_id=app_id,
+        model_name="gpt-4",
+        temperature=0.8,  # More creative for recommendations
+        max_tokens=1500
+    )
+    logger.info("   ✓ Model configured")
+
+
+async def _configure_parameters(client, app_id, params_task):
+    """Steps 4-5: variables and opening statement merged into one parameters update"""
+    # Baseline parameters were prefetched while the first write was in flight
+    params = await params_task
+    params['user_input_form'] = [
+        make_variable("budget", "text-input", "Budget Range", required=False, max_length=48),
+        make_variable("category", "text-input", "Product Category", required=True, max_length=48)
+    ]
+    params['opening_statement'] = "🛍️ Hi! I'm here to help you find the perfect product. What are you looking for?"
+    params['suggested_questions'] = [
+        "I need a laptop for programming",
+        "Looking for running shoes under $150",
+        "Best headphones for music production"
+    ]
+    await client.aupdate_app_parameters(app_id, params)
+    logger.info("   ✓ Variables added")
+    logger.info("   ✓ Opening statement set")
+
+
+async def _configure_app(client, app_id, prompt):
+    """Run the model-config and parameters updates side by side"""
+    # Each resource is read-modified-written, so writes to the same
+    # resource stay sequential to avoid lost updates
+    try:
+        params_task = asyncio.create_task(client.aget_app_parameters(app_id))
+        await asyncio.gather(
+            _configure_model(client, app_id, prompt),
+            _configure_parameters(client, app_id, params_task)
+        )
+    finally:
+        await client.aclose()
+
+
 def create_and_configure_app_example(client):
     """Create a new app and fully configure it"""
     
-    print("\n" + "="*60)
-    print("Creating and configuring a complete app...")
-    print("="*60 + "\n")
+    logger.info("\n" + "="*60)
+    logger.info("Creating and configuring a complete app...")
+    logger.info("="*60 + "\n")
     
     # Step 1: Create the app
-    print("1. Creating app...")
+    logger.info("1. Creating app...")
     app = client.create_app(
         name="Product Recommendation Assistant",
         mode="chat",
@@ -196,67 +292,15 @@ def create_and_configure_app_example(client):
         description="Helps users find the perfect product"
     )
     app_id = app['id']
-    print(f"   ✓ App created with ID: {app_id}")
-    
-    # Step 2: Set the prompt
-    print("\n2. Setting system prompt...")
-    prompt = """You are a product recommendation expert. Help users find products that match their needs.
-
-Ask clarifying questions about:
-- Budget
-- Use case
-- Preferences
-- Must-have features
-
-Then provide 3-5 personalized recommendations with explanations."""
-    
-    client.update_prompt(app_id, prompt)
-    print("   ✓ Prompt configured")
-    
-    # Step 3: Configure model
-    print("\n3. Configuring AI model...")
-    client.update_model_settings(
-        app_id=app_id,
-        model_name="gpt-4",
-        temperature=0.8,  # More creative for recommendations
-        max_tokens=1500
-    )
-    print("   ✓ Model configured")
+    logger.info(f"   ✓ App created with ID: {app_id}")
     
-    # Step 4: Add variables
-    print("\n4. Adding input variables...")
-    client.add_variable(
-        app_id=app_id,
-        variable_name="budget",
-        variable_type="text-input",
-        label="Budget Range",
-        required=False
-    )
-    client.add_variable(
-        app_id=app_id,
-        variable_name="category",
-        variable_type="text-input",
-        label="Product Category",
-        required=True
-    )
-    print("   ✓ Variables added")
+    # Steps 2-5: configure the app concurrently
+    logger.info("\n2-5. Configuring prompt, model, variables and welcome message...")
+    asyncio.run(_configure_app(client, app_id, _RECOMMENDATION_PROMPT))
     
-    # Step 5: Set opening statement
-    print("\n5. Setting welcome message...")
-    client.update_opening_statement(
-        app_id=app_id,
-        opening_statement="🛍️ Hi! I'm here to help you find the perfect product. What are you looking for?",
-        suggested_questions=[
-            "I need a laptop for programming",
-            "Looking for running shoes under $150",
-            "Best headphones for music production"
-        ]
-    )
-    print("   ✓ Opening statement set")
-    
-    print("\n" + "="*60)
-    print(f"✅ App fully configured! App ID: {app_id}")
-    print("="*60 + "\n")
+    logger.info("\n" + "="*60)
+    logger.info(f"✅ App fully configured! App ID: {app_id}")
+    logger.info("="*60 + "\n")
     
     return app_id
 
@@ -264,98 +308,226 @@ Then provide 3-5 personalized recommendations with explanations."""
 # ============================================================================
 # EXAMPLE 9: Bulk Update Multiple Apps
 # ============================================================================
+# Settings pushed to every app by the bulk examples
+# (every field update_model_settings sends, so the skip check compares all of them)
+_BULK_SETTINGS = {"model_name": "gpt-4", "temperature": 0.7, "max_tokens": 2048, "top_p": 1.0}
+
+# Result marker for apps whose live settings already match
+_SKIPPED = "skipped"
+
+
+def _matches_bulk_settings(current):
+    """True if an app's current model settings already equal _BULK_SETTINGS"""
+    return all(current.get(k) == v for k, v in _BULK_SETTINGS.items())
+
+
+def _send_key(applied, key):
+    """Idempotency key to send for a write the live read says is needed"""
+    # A recent success under the same key means the app was changed since
+    # (e.g. by hand); send no key so the server doesn't dedupe the re-apply
+    if applied is not None and key in applied:
+        return None
+    return key
+
+
+async def bulk_update_apps_async(client, apps=None, applied=None, concurrency=8):
+    """
+    Update model settings on all apps, at most `concurrency` at a time
+    
+    With apps=None the app list is paged in, and updates for each page
+    start while the next page is still loading. Apps whose live settings
+    already match are skipped; successful writes are recorded in `applied`
+    (an AppliedUpdates store) in one transaction at the end.
+    Returns a list of (app, result or exception) pairs.
+    """
+    sem = asyncio.Semaphore(concurrency)
+    # Pace requests and back off when Dify starts answering 429
+    client.rate_limiter = RateLimiter(rate=concurrency, burst=concurrency)
+    # Keys of successful writes, saved together once all updates finish
+    done = []
+    
+    async def update_one(app):
+        key = idempotency_key(app['id'], _BULK_SETTINGS)
+        async with sem:
+            # Reads are cheap (conditional GETs); skip the write if nothing would change
+            current = await client.aget_model_settings(app['id'])
+            if _matches_bulk_settings(current):
+                return _SKIPPED
+            # sqlite lookups block, so keep them off the event loop
+            send_key = await asyncio.to_thread(_send_key, applied, key)
+            result = await client.aupdate_model_settings(
+                app_id=app['id'], idempotency_key=send_key, **_BULK_SETTINGS
+            )
+        done.append(key)
+        return result
+    
+    try:
+        if apps is None:
+            apps, tasks = [], []
+            async for app in client.aiter_apps():
+                apps.append(app)
+                tasks.append(asyncio.create_task(update_one(app)))
+        else:
+            tasks = [update_one(app) for app in apps]
+        # return_exceptions so one failed app doesn't abort the rest
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        if applied is not None and done:
+            await asyncio.to_thread(applied.add_many, done)
+        return list(zip(apps, results))
+    finally:
+        client.rate_limiter = None
+        await client.aclose()
+
+
+def bulk_update_apps_threaded(client, apps, applied=None, max_workers=8):
+    """
+    Update model settings on all apps from a thread pool (no httpx needed)
+    
+    Returns a list of (app, result or exception) pairs.
+    """
+    
+    def update_one(app):
+        key = idempotency_key(app['id'], _BULK_SETTINGS)
+        if _matches_bulk_settings(client.get_model_settings(app['id'])):
+            return _SKIPPED
+        result = client.update_model_settings(
+            app_id=app['id'], idempotency_key=_send_key(applied, key), **_BULK_SETTINGS
+        )
+        if applied is not None:
+            applied.add(key)
+        return result
+    
+    # All workers share the client's pooled session
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(update_one, app) for app in apps]
+    # Like gather(return_exceptions=True): failures come back as results
+    return [(app, future.exception() or future.result())
+            for app, future in zip(apps, futures)]
+
+
 def bulk_update_apps_example(client):
     """Update multiple apps at once"""
     
-    print("Fetching all apps...")
-    apps_response = client.get_apps()
-    apps = apps_response.get('data', [])
+    logger.info("Fetching all apps...")
+    apps = list(client.iter_apps())
     
-    print(f"Found {len(apps)} apps. Updating all...")
+    logger.info(f"Found {len(apps)} apps. Updating all...")
     
-    for app in apps:
-        app_id = app['id']
+    # One request for every app when the server has a batch endpoint
+    updates = [
+        {"app_id": app['id'], "model": _BULK_SETTINGS["model_name"],
+         "temperature": _BULK_SETTINGS["temperature"], "max_tokens": _BULK_SETTINGS["max_tokens"],
+         "top_p": _BULK_SETTINGS["top_p"]}
+        for app in apps
+    ]
+    if client.bulk_update_model_settings(updates) is not None:
+        logger.info(f"  ✓ {len(apps)} apps updated in one batch")
+        logger.info("\n✅ Bulk update complete!")
+        return
+    
+    # Otherwise fall back to concurrent per-app updates, skipping any
+    # whose live settings already match
+    applied = AppliedUpdates()
+    try:
+        if httpx is not None:
+            results = asyncio.run(bulk_update_apps_async(client, apps, applied))
+        else:
+            results = bulk_update_apps_threaded(client, apps, applied)
+    finally:
+        applied.close()
+    
+    for app, result in results:
         app_name = app['name']
-        
-        print(f"\nUpdating: {app_name}")
-        
-        # Update model settings for all apps
-        try:
-            client.update_model_settings(
-                app_id=app_id,
-                model_name="gpt-4",
-                temperature=0.7,
-                max_tokens=2048
-            )
-            print(f"  ✓ {app_name} updated")
-        except Exception as e:
-            print(f"  ✗ {app_name} failed: {e}")
-    
-    print("\n✅ Bulk update complete!")
+        if isinstance(result, Exception):
+            logger.info(f"  ✗ {app_name} failed: {result}")
+        elif result is _SKIPPED:
+            logger.info(f"  - {app_name} already up to date, skipped")
+        else:
+            logger.info(f"  ✓ {app_name} updated")
+    
+    logger.info("\n✅ Bulk update complete!")
 
 
 # ============================================================================
 # EXAMPLE 10: Get Current Configuration
 # ============================================================================
+async def _fetch_app_config(client, app_id):
+    """Read app details, prompt config and parameters concurrently"""
+    try:
+        return await asyncio.gather(
+            client.aget_app_detail(app_id),
+            client.aget_prompt_config(app_id),
+            client.aget_app_parameters(app_id)
+        )
+    finally:
+        await client.aclose()
+
+
 def inspect_app_config_example(client, app_id):
     """View current app configuration"""
     
-    print(f"\nInspecting app configuration...")
-    print("="*60)
+    logger.info(f"\nInspecting app configuration...")
+    logger.info("="*60)
     
-    # Get app details
-    app = client.get_app_detail(app_id)
-    print(f"\nApp Name: {app.get('name')}")
-    print(f"Mode: {app.get('mode')}")
-    print(f"Icon: {app.get('icon')}")
+    # Fetch details, prompt config and parameters at the same time
+    app, config, params = asyncio.run(_fetch_app_config(client, app_id))
     
-    # Get prompt config
-    config = client.get_prompt_config(app_id)
-    print(f"\nCurrent Prompt:")
-    print(config.get('prompt_template', 'N/A'))
+    # App details
+    logger.info(f"\nApp Name: {app.get('name')}")
+    logger.info(f"Mode: {app.get('mode')}")
+    logger.info(f"Icon: {app.get('icon')}")
     
-    # Get parameters
-    params = client.get_app_parameters(app_id)
-    print(f"\nOpening Statement:")
-    print(params.get('opening_statement', 'N/A'))
+    # Prompt config
+    logger.info(f"\nCurrent Prompt:")
+    logger.info(config.get('prompt_template', 'N/A'))
     
-    print(f"\nVariables:")
+    # Parameters
+    logger.info(f"\nOpening Statement:")
+    logger.info(params.get('opening_statement', 'N/A'))
+    
+    logger.info(f"\nVariables:")
     for var in params.get('user_input_form', []):
-        print(f"  - {var.get('label')} ({var.get('variable')})")
+        logger.info(f"  - {var.get('label')} ({var.get('variable')})")
     
-    print("="*60)
+    logger.info("="*60)
 
 
 # ============================================================================
 # MAIN - Run Examples
 # ============================================================================
 if __name__ == "__main__":
-    print("Dify App Modification Examples")
-    print("="*60)
-    
-    # Setup
-    client = setup_client()
-    print("✓ Logged in successfully\n")
-    
-    # Get first app for examples
-    apps = client.get_apps()
-    if apps.get('data'):
-        app_id = apps['data'][0]['id']
-        print(f"Using app ID: {app_id}\n")
+    # Single output channel, so lines keep their order
+    log_listener = _start_logging()
+    try:
+        logger.info("Dify App Modification Examples")
+        logger.info("="*60)
+    
+        # Setup (the client closes its connection pool on exit)
+        with setup_client() as client:
+            logger.info("✓ Logged in successfully\n")
+        
+            # Get first app for examples
+            apps = client.get_apps()
+            if apps.get('data'):
+                app_id = apps['data'][0]['id']
+                logger.info(f"Using app ID: {app_id}\n")
         
-        # Uncomment the examples you want to run:
+                # Uncomment the examples you want to run:
         
-        # update_app_prompt_example(client, app_id)
-        # update_model_settings_example(client, app_id)
-        # add_variables_example(client, app_id)
-        # update_opening_statement_example(client, app_id)
-        # rename_app_example(client, app_id)
-        # inspect_app_config_example(client, app_id)
+                # update_app_prompt_example(client, app_id)
+                # update_model_settings_example(client, app_id)
+                # add_variables_example(client, app_id)
+                # update_opening_statement_example(client, app_id)
+                # rename_app_example(client, app_id)
+                # inspect_app_config_example(client, app_id)
         
-        # Or create a complete new app:
-        # create_and_configure_app_example(client)
+                # Or create a complete new app:
+                # create_and_configure_app_example(client)
         
-        print("\n💡 Uncomment the examples you want to run in the code!")
-    else:
-        print("No apps found. Create one first!")
-        # create_and_configure_app_example(client)
+                logger.info("\n💡 Uncomment the examples you want to run in the code!")
+            else:
+                logger.info("No apps found. Create one first!")
+                # create_and_configure_app_example(client)
+    finally:
+        # Flush anything still queued
+        log_listener.stop()
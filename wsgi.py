@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+"""
+WSGI entry point for running the API server under gunicorn + gevent
+
+    gunicorn --worker-class gevent --workers 1 --worker-connections 200 wsgi:app
+"""
+
+# Patch sockets before requests/urllib3 are imported so the client's
+# connection pools use cooperative gevent sockets
+from gevent import monkey
+monkey.patch_all()
+
+from api_server import app  # noqa: E402